@@ -1,47 +1,41 @@
 import os
-from dotenv import load_dotenv
-import google.generativeai as genai
-from google.adk.agents import LlmAgent
-from google.adk.apps.app import App, EventsCompactionConfig
-from google.adk.runners import Runner
-
-# Import our custom services and tools
-from services.session_service import TinyDBSessionService
-from services.knowledge_service import KnowledgeService
-from tools.document_tools import create_document_tools
-from tools.github_tool import create_github_tools
-
-# --- 1. Configure genai (for tools) ---
+from functools import lru_cache
+
+
+def _load_env_file(path):
+    """Tiny .env loader: KEY=VALUE lines, '#' comments, optional quotes.
+
+    Replaces the python-dotenv import on the startup path — we only need
+    the simple subset of its behaviour here. Values already present in the
+    environment win over the file.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                line = line.strip()
+                if not line or line.startswith('#') or '=' not in line:
+                    continue
+                key, _, value = line.partition('=')
+                key = key.strip()
+                value = value.strip().strip('"\'')
+                if key:
+                    os.environ.setdefault(key, value)
+    except OSError:
+        # Missing .env is fine; the environment may already be configured.
+        pass
+
+
+# --- 1. Paths and environment ---
 # Load .env from project root so developers don't need to set env every time
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 dotenv_path = os.path.join(PROJECT_ROOT, ".env")
-load_dotenv(dotenv_path)
-gemini_key = os.environ.get("GEMINI_API_KEY")
-if not gemini_key:
-    print("FATAL ERROR: GEMINI_API_KEY not found in environment.")
-    print("Please create a .env file in the project root with GEMINI_API_KEY=<your_key>")
-    exit(1)
-
-genai.configure(api_key=gemini_key)
-
-# --- 2. Initialize Services ---
-# Use absolute paths for TinyDB files so they are created in the repo root
-chat_db_path = os.path.join(PROJECT_ROOT, "chat_history_db.json")
-kb_db_path = os.path.join(PROJECT_ROOT, "knowledge_db.json")
-chat_session_service = TinyDBSessionService(chat_db_path)
-knowledge_service = KnowledgeService(kb_db_path)
-
-# --- 3. Create Tools ---
-resumes_dir = os.path.join(PROJECT_ROOT, 'resumes')
-document_tools = create_document_tools(knowledge_service, resumes_dir=resumes_dir)
-# Pass any pre-loaded GitHub env vars into the tool factory so the tool
-# uses values available at startup (avoids relying on later interactive prompts)
-github_username = os.environ.get("GITHUB_USERNAME")
-github_token = os.environ.get("GITHUB_TOKEN")
-github_tools = create_github_tools(github_username, github_token)
-all_tools = document_tools + github_tools
-
-# --- 4. Define Agent Instruction ---
+_load_env_file(dotenv_path)
+
+# Use absolute paths for the SQLite files so they are created in the repo root
+chat_db_path = os.path.join(PROJECT_ROOT, "chat_history.db")
+kb_db_path = os.path.join(PROJECT_ROOT, "knowledge.db")
+
+# --- 2. Define Agent Instruction ---
 SYSTEM_INSTRUCTION = """
 You are a professional assistant whose primary job is to write job application emails and cover letters
 based on the user's resume(s) and public GitHub profile. When a user asks for an email or cover letter,
@@ -62,8 +56,9 @@ Tone rules:
     a friendly and slightly playful tone — keep it enjoyable while remaining professional.
 
 Knowledge sources and required tools:
-1. STATIC KNOWLEDGE (Resumes): Use `query_knowledge_base_tool` every time you need facts about the
-     user's past roles, skills, or education.
+1. STATIC KNOWLEDGE (Resumes): Use `query_knowledge_base_tool` to list what is stored (one line per
+     document with an id), then `get_summary_by_id_tool` to pull the full summaries you actually need
+     for facts about the user's past roles, skills, or education.
 2. PUBLIC GITHUB PROFILE (Dynamic): Use `github_profile_tool` to obtain the user's public projects,
      languages, and recent activity. Incorporate this information to highlight recent projects, popular
      languages, or relevant repositories in cover letters and emails.
@@ -75,7 +70,8 @@ Workflow (summary):
 - If asked to write an email/cover letter:
     1. Use any job posting text/file included in the user's message. If none is present, call `query_knowledge_base_tool`
          and `github_profile_tool` and generate a sample job description only if necessary.
-    2. Call `query_knowledge_base_tool` for resume details.
+    2. Call `query_knowledge_base_tool` for the document listing, then `get_summary_by_id_tool` for
+         the relevant resume details.
     3. Call `github_profile_tool` to gather public project and language signals.
     4. Combine all sources and produce a tailored email and cover letter that emphasizes the user's
          most relevant skills, recent projects, and achievements.
@@ -87,30 +83,100 @@ When including GitHub info, summarize the top repos (name, stars, primary langua
 paragraphs for emails; one page max for cover letters).
 """
 
-# --- 5. Create the Agent ---
-agent = LlmAgent(
-    model="gemini-2.0-flash",
-    name="document_agent",
-    instruction=SYSTEM_INSTRUCTION,
-    tools=all_tools
-)
-
-# --- 6. Configure Context Compaction (for chat history) ---
-compaction_config = EventsCompactionConfig(
-    compaction_interval=20,
-    overlap_size=1
-)
-
-# --- 7. Create the App ---
-app = App(
-    name="document_app",
-    root_agent=agent,
-    events_compaction_config=compaction_config
-)
-
-# --- 8. Create the Runner ---
-runner = Runner(
-    agent=agent,
-    app_name="document_app",
-    session_service=chat_session_service
-)
\ No newline at end of file
+# --- 3. Lazy initialization ---
+# The google.generativeai / google.adk import chain is expensive (hundreds of
+# ms of cold start), so we defer it to first use. Flask endpoints that never
+# touch the agent (index, uploads, static files) then never pay for it.
+# Each component has its own memoized accessor so e.g. clearing the chat
+# history only opens the session DB without building the agent.
+_genai_configured = False
+
+
+def _configure_genai():
+    """Configure the genai SDK exactly once, on first use."""
+    global _genai_configured
+    if _genai_configured:
+        return
+    import google.generativeai as genai
+
+    gemini_key = os.environ.get("GEMINI_API_KEY")
+    if not gemini_key:
+        print("FATAL ERROR: GEMINI_API_KEY not found in environment.")
+        print("Please create a .env file in the project root with GEMINI_API_KEY=<your_key>")
+        raise RuntimeError("GEMINI_API_KEY not found in environment")
+
+    genai.configure(api_key=gemini_key)
+    _genai_configured = True
+
+
+@lru_cache(maxsize=1)
+def get_chat_session_service():
+    from services.session_service import SqliteSessionService
+    return SqliteSessionService(chat_db_path)
+
+
+@lru_cache(maxsize=1)
+def get_knowledge_service():
+    from services.knowledge_service import KnowledgeService
+    return KnowledgeService(kb_db_path)
+
+
+@lru_cache(maxsize=1)
+def get_document_tools():
+    # The tools call the genai API directly, so make sure it is configured.
+    _configure_genai()
+    from tools.document_tools import create_document_tools
+
+    resumes_dir = os.path.join(PROJECT_ROOT, 'resumes')
+    return create_document_tools(get_knowledge_service(), resumes_dir=resumes_dir)
+
+
+@lru_cache(maxsize=1)
+def get_github_tools():
+    from tools.github_tool import create_github_tools
+
+    # Pass any pre-loaded GitHub env vars into the tool factory so the tool
+    # uses values available at startup (avoids relying on later interactive prompts)
+    github_username = os.environ.get("GITHUB_USERNAME")
+    github_token = os.environ.get("GITHUB_TOKEN")
+    return create_github_tools(github_username, github_token)
+
+
+@lru_cache(maxsize=1)
+def get_agent():
+    _configure_genai()
+    from google.adk.agents import LlmAgent
+
+    return LlmAgent(
+        model="gemini-2.0-flash",
+        name="document_agent",
+        instruction=SYSTEM_INSTRUCTION,
+        tools=get_document_tools() + get_github_tools()
+    )
+
+
+@lru_cache(maxsize=1)
+def get_app():
+    from google.adk.apps.app import App, EventsCompactionConfig
+
+    # Configure Context Compaction (for chat history)
+    compaction_config = EventsCompactionConfig(
+        compaction_interval=20,
+        overlap_size=1
+    )
+    return App(
+        name="document_app",
+        root_agent=get_agent(),
+        events_compaction_config=compaction_config
+    )
+
+
+@lru_cache(maxsize=1)
+def get_runner():
+    from google.adk.runners import Runner
+
+    return Runner(
+        agent=get_agent(),
+        app_name="document_app",
+        session_service=get_chat_session_service()
+    )
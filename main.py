@@ -1,7 +1,7 @@
 import asyncio
 import os
 import re
-from dotenv import load_dotenv
+import sys
 import google.generativeai as genai
 import time
 import logging
@@ -9,83 +9,94 @@ import logging
 # Use ADK Event objects for messages
 from google.adk.events import Event
 from google.genai import types as genai_types
-from adk_config import runner, agent
+# adk_config owns all shared initialization (.env loading, genai.configure,
+# services, agent, runner) — both this CLI and the Flask app go through it.
+from adk_config import get_runner, get_agent
 from google.adk.sessions import Session
 
 
-class LocalMessage:
-    """Lightweight message object with `role` and `content` attributes
-    to mimic the ADK Message shape expected by Runner.run_async.
+# re.ASCII: the marker syntax is plain ASCII, so skip Unicode tables.
+FILE_PATTERN = re.compile(r"\[file:\s*(.*?)\s*\]", re.ASCII)
+
+
+def split_file_marker(user_message: str) -> tuple[str, str | None]:
+    """Split the first '[file: path]' marker out of a message in one regex
+    pass. Returns (cleaned_text, file_path_or_None). The cheap substring
+    check means ordinary messages never touch the regex engine.
     """
-    def __init__(self, *, content, role: str = "user"):
-        self.content = content
-        self.role = role
-        # Normalize parts so Runner can access `new_message.parts`
-        # If content is a genai.types.Content with parts, use them.
-        if hasattr(content, 'parts') and content.parts is not None:
-            self.parts = list(content.parts)
-        else:
-            # If content has a text attribute, use it; otherwise stringify
-            text_val = None
-            if hasattr(content, 'text') and content.text:
-                text_val = content.text
-            elif isinstance(content, str):
-                text_val = content
-            elif content is None:
-                text_val = ""
-            else:
-                try:
-                    text_val = str(content)
-                except Exception:
-                    text_val = ""
+    if '[file:' not in user_message:
+        return user_message, None
+    parts = FILE_PATTERN.split(user_message, maxsplit=1)
+    if len(parts) != 3:
+        return user_message, None
+    before, file_path_str, after = parts
+    return (before + after).strip(), file_path_str.strip()
+
+
+# Lazy basename -> path index for [file: ...] lookups. os.walk(os.getcwd())
+# on every miss re-stats the whole workspace each turn; instead we build the
+# index once with os.scandir and answer lookups from the dict. Rebuilt on
+# demand via _invalidate_file_index() (e.g. after a stale hit).
+_BASENAME_INDEX: dict[str, str] | None = None
+_INDEX_SKIP_DIRS = {'.git', 'node_modules', '__pycache__', 'processed'}
+
+
+def _build_file_index(root: str) -> dict[str, str]:
+    idx: dict[str, str] = {}
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in _INDEX_SKIP_DIRS:
+                            stack.append(entry.path)
+                    else:
+                        # First occurrence wins, matching os.walk order closely enough
+                        idx.setdefault(entry.name, entry.path)
+        except OSError:
+            continue
+    return idx
 
-            # Wrap into a single Part
-            try:
-                self.parts = [genai_types.Part(text=text_val)]
-            except Exception:
-                # Fallback: simple dict-like part
-                class _P: pass
-                p = _P()
-                p.text = text_val
-                self.parts = [p]
 
-FILE_PATTERN = re.compile(r"\[file:\s*(.*?)\s*\]")
+def _invalidate_file_index():
+    global _BASENAME_INDEX
+    _BASENAME_INDEX = None
 
 
 def find_file_by_basename(basename: str) -> str | None:
-    """Search the workspace (cwd) for a file with the given basename and
-    return the first matching absolute path, or None if not found.
+    """Look up a file in the workspace (cwd) by basename and return its
+    absolute path, or None if not found. Backed by a lazily built index.
     """
-    start = os.getcwd()
-    for root, dirs, files in os.walk(start):
-        if basename in files:
-            return os.path.join(root, basename)
-    return None
+    global _BASENAME_INDEX
+    if _BASENAME_INDEX is None:
+        _BASENAME_INDEX = _build_file_index(os.getcwd())
+    path = _BASENAME_INDEX.get(basename)
+    if path is None or not os.path.exists(path):
+        # Miss or stale entry: the file may have been added, moved or
+        # deleted since indexing — rebuild once and retry. Costs one walk,
+        # only on misses, same as the old os.walk behaviour.
+        _BASENAME_INDEX = _build_file_index(os.getcwd())
+        path = _BASENAME_INDEX.get(basename)
+    return path
 
 async def main():
-    # Load .env from project root so environment variables (GITHUB_USERNAME,
-    # GEMINI_API_KEY, etc.) are available without needing to set them via CLI.
-    repo_root = os.path.dirname(os.path.abspath(__file__))
-    dotenv_path = os.path.join(repo_root, ".env")
-    if os.path.exists(dotenv_path):
-        load_dotenv(dotenv_path=dotenv_path)
-    else:
-        # Fallback to default behavior (look in cwd / environment)
-        load_dotenv()
     # Configure logging optionally via DEBUG env
     if os.getenv("DEBUG", "").lower() in ("1", "true", "yes"):
         logging.basicConfig(level=logging.DEBUG)
-    
+
+    # Build the agent/runner on demand. adk_config loads .env and calls
+    # genai.configure exactly once, shared with the Flask entrypoint.
     try:
-        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-    except KeyError:
-        return
-    except Exception as e:
+        runner = get_runner()
+        agent = get_agent()
+    except RuntimeError as e:
         print(f"Error configuring Gemini API: {e}")
         return
 
     user_id = "doc_user_1"
-    session_id = "doc_chat_session" 
+    session_id = "doc_chat_session"
 
     print("--- Starting Document Agent ---")
     print(f"Using chat session: {session_id}")
@@ -95,27 +106,27 @@ async def main():
     print("1. 'Process my resumes' (to load static knowledge)")
     print("2. 'Write a cover letter for this job [file: user_uploads/job_posting.jpg]'")
     print("(Type 'quit' to exit)\n")
-    
+
+    # The session only needs to be established once; probing the session
+    # service on every turn is two DB round trips for nothing.
+    session_initialized = False
+
     while True:
         try:
-            user_message = input("You: ")
+            # input() blocks the event loop; run it in a thread so the genai
+            # client's keep-alives and any background tasks stay serviced
+            # while the user types.
+            user_message = await asyncio.to_thread(input, "You: ")
             if user_message.lower().strip() == 'quit':
                 print("Agent: Goodbye! Your session is saved.")
                 break
 
-            text_part = user_message
             temp_file_to_delete = None
-            
-            # --- This logic is correct ---
-            message_content_parts = []
-
-            # 1. Check for file paths
-            match = FILE_PATTERN.search(user_message)
-            
-            if match:
-                file_path_str = match.group(1).strip()
-                text_part = FILE_PATTERN.sub("", user_message).strip()
-                
+
+            # 1. Check for file paths (single-pass split, see split_file_marker)
+            text_part, file_path_str = split_file_marker(user_message)
+
+            if file_path_str:
                 # If the provided path doesn't exist, try searching by basename
                 resolved_path = None
                 if os.path.exists(file_path_str):
@@ -133,49 +144,34 @@ async def main():
                     print(f"Uploading {resolved_path} as dynamic context...")
                     # Upload the file using genai
                     uploaded_file = genai.upload_file(path=resolved_path)
-                    # Add the file object to our parts list
-                    message_content_parts.append(uploaded_file)
                     temp_file_to_delete = uploaded_file
-            
-            # 2. Add the text part (as a simple string)
-            message_content_parts.append(text_part)
-            
-            # 3. Create an ADK Event object. Combine text and any uploaded file
-            # references into a single content string so the session/event
-            # serializers can persist it.
-            # Build a google.genai.types.Content with Parts for text and files
-            parts = []
-            for part in message_content_parts:
-                if hasattr(part, "name"):
-                    # If uploaded_file has a name/filename, attach as FileData
-                    try:
-                        filedata = genai_types.FileData(name=part.name)
-                        parts.append(genai_types.Part(file_data=filedata))
-                    except Exception:
-                        # Fallback: include a simple text reference
-                        parts.append(genai_types.Part(text=f"[uploaded_file:{getattr(part,'name',str(part))}]"))
-                else:
-                    parts.append(genai_types.Part(text=str(part)))
 
-            content_obj = genai_types.Content(parts=parts)
+            # 2. Build the Content directly — ADK accepts genai_types.Content
+            # as new_message, so no intermediate wrapper is needed.
+            parts = []
+            if temp_file_to_delete is not None:
+                parts.append(genai_types.Part(file_data=genai_types.FileData(
+                    name=temp_file_to_delete.name,
+                    mime_type=getattr(temp_file_to_delete, 'mime_type', None)
+                )))
+            if text_part:
+                parts.append(genai_types.Part(text=text_part))
 
-            # Construct a lightweight message object with .role and .content
-            # Runner.run_async expects new_message.role to exist, so use
-            # LocalMessage to satisfy that contract.
-            final_message_to_send = LocalMessage(content=content_obj, role="user")
-            # --- End of logic ---
+            final_message_to_send = genai_types.Content(role="user", parts=parts)
 
             agent_response_text = ""
-            print("Agent: ...", end="", flush=True) 
+            print("Agent: ", end="", flush=True)
 
-            # Ensure the session exists before running the agent
-            try:
-                existing_session = await runner.session_service.get_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
-            except Exception:
-                existing_session = None
+            # Ensure the session exists before running the agent (once)
+            if not session_initialized:
+                try:
+                    existing_session = await runner.session_service.get_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
+                except Exception:
+                    existing_session = None
 
-            if not existing_session:
-                await runner.session_service.create_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
+                if not existing_session:
+                    await runner.session_service.create_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
+                session_initialized = True
 
             # Pass the 'Message' object. This will have the '.role' attribute.
             async for event in runner.run_async(
@@ -184,32 +180,26 @@ async def main():
                 new_message=final_message_to_send 
             ):
                 if event.author == agent.name:
-                    # Extract text from event.content which may be a genai.types.Content
                     content = getattr(event, 'content', None)
-                    text_parts = []
-                    if content is None:
-                        agent_response_text = ""
-                    else:
-                        # If it's a simple string
-                        if isinstance(content, str):
-                            agent_response_text = content
-                        else:
-                            # If it has 'text' attribute, prefer it
-                            if hasattr(content, 'text') and content.text:
-                                agent_response_text = content.text
-                            else:
-                                # Try to assemble from .parts
-                                parts = getattr(content, 'parts', None)
-                                if parts:
-                                    for p in parts:
-                                        if getattr(p, 'text', None):
-                                            text_parts.append(p.text)
-                                    agent_response_text = "\n".join(text_parts).strip()
-            
+                    event_parts = getattr(content, 'parts', None)
+                    if event_parts:
+                        text = "\n".join(
+                            p.text for p in event_parts if getattr(p, 'text', None)
+                        ).strip()
+                        if text:
+                            # Render incrementally as responses arrive
+                            print(text, end="", flush=True)
+                            agent_response_text += text
+
+                # Stop consuming once the terminal event has arrived; any
+                # trailing telemetry events would only add latency here.
+                if getattr(event, 'is_final_response', lambda: False)():
+                    break
+
             if agent_response_text:
-                print(f"\rAgent: {agent_response_text}  ") 
+                print()
             else:
-                print("\rAgent: (Action completed)   ")
+                print("(Action completed)")
 
         except Exception as e:
             import traceback
@@ -222,4 +212,13 @@ async def main():
                 genai.delete_file(temp_file_to_delete.name)
 
 if __name__ == "__main__":
+    # uvloop's C event loop cuts per-callback overhead for the many awaited
+    # SDK calls; it doesn't support Windows, and the app still runs fine on
+    # the default loop when it isn't installed.
+    if sys.platform != 'win32':
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            pass
     asyncio.run(main())
\ No newline at end of file
@@ -1,47 +1,235 @@
-import tinydb
+import atexit
+import logging
+import sqlite3
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+log = logging.getLogger(__name__)
+
+# Queue-backed logging, same setup as tools.document_tools: save_summary
+# runs per file from a gathered fan-out, and a blocking print/stream write
+# there would serialize the workers. The listener thread does the I/O.
+if not log.handlers:
+    _log_queue = SimpleQueue()
+    log.addHandler(QueueHandler(_log_queue))
+    _log_listener = QueueListener(_log_queue, logging.StreamHandler())
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
 
 class KnowledgeService:
     """
-    Manages a persistent TinyDB knowledge base for file summaries.
+    Manages a persistent SQLite knowledge base for file summaries.
     This is separate from the chat session history.
+
+    Replaces the earlier TinyDB backend: `file_name` is the primary key so
+    lookups are b-tree probes instead of full JSON-file scans.
     """
-    def __init__(self, db_path: str = "knowledge_db.json"):
-        self.db = tinydb.TinyDB(db_path)
-        self.table = self.db.table("knowledge")
-        print(f"Knowledge Service connected to '{db_path}'")
+    def __init__(self, db_path: str = "knowledge.db"):
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS knowledge ("
+            " file_name TEXT PRIMARY KEY,"
+            " summary TEXT NOT NULL,"
+            " type TEXT NOT NULL,"
+            " sha256 TEXT)"
+        )
+        # Migrate databases created before the sha256 column existed.
+        cols = [r[1] for r in self.conn.execute("PRAGMA table_info(knowledge)")]
+        if "sha256" not in cols:
+            self.conn.execute("ALTER TABLE knowledge ADD COLUMN sha256 TEXT")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_knowledge_sha ON knowledge (sha256)"
+        )
+        # In-process mirror of the stored file names so the hot
+        # has_summary() check is a set lookup, not a query per file.
+        self._known = {row[0] for row in self.conn.execute("SELECT file_name FROM knowledge")}
+        log.info("Knowledge Service connected to '%s'", db_path)
 
-    def save_summary(self, file_name: str, summary: str, source_type: str):
+    def save_summary(self, file_name: str, summary: str, source_type: str, sha256: str = None):
         """Saves or updates a summary for a specific file."""
-        KnowledgeQuery = tinydb.Query()
-        self.table.upsert(
-            {"file_name": file_name, "summary": summary, "type": source_type},
-            KnowledgeQuery.file_name == file_name
-        )
-        print(f"Knowledge Service: Saved summary for: {file_name}")
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO knowledge (file_name, summary, type, sha256) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(file_name) DO UPDATE SET summary=excluded.summary,"
+                " type=excluded.type, sha256=excluded.sha256",
+                (file_name, summary, source_type, sha256)
+            )
+            self._known.add(file_name)
+        log.info("Knowledge Service: Saved summary for: %s", file_name)
+
+    def save_summaries_bulk(self, rows):
+        """Insert/update many summaries in one transaction.
+
+        `rows` is an iterable of (file_name, summary, source_type, sha256)
+        tuples. The connection runs in autocommit mode, so batching them
+        under an explicit BEGIN means one fsync per batch instead of one
+        per file.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO knowledge (file_name, summary, type, sha256) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(file_name) DO UPDATE SET summary=excluded.summary,"
+                    " type=excluded.type, sha256=excluded.sha256",
+                    rows
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self._known.update(row[0] for row in rows)
+        log.info("Knowledge Service: Saved summaries for %d files.", len(rows))
+
+    def get_summary_by_hash(self, sha256: str):
+        """Return a stored summary whose content hash matches, or None.
+
+        Lets the tools skip a Gemini call when the same bytes were already
+        summarized under a different file name.
+        """
+        if not sha256:
+            return None
+        row = self.conn.execute(
+            "SELECT file_name, summary, type FROM knowledge WHERE sha256 = ? LIMIT 1",
+            (sha256,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"file_name": row[0], "summary": row[1], "type": row[2]}
 
     def has_summary(self, file_name: str) -> bool:
         """Return True if a summary for the given file_name already exists."""
-        KnowledgeQuery = tinydb.Query()
-        res = self.table.search(KnowledgeQuery.file_name == file_name)
-        return len(res) > 0
+        return file_name in self._known
+
+    def invalidate(self):
+        """Reload the in-memory name set (call after external DB edits)."""
+        with self._lock:
+            self._known = {row[0] for row in self.conn.execute("SELECT file_name FROM knowledge")}
 
     def get_summary(self, file_name: str):
         """Return the stored summary document for a given file_name, or None."""
-        KnowledgeQuery = tinydb.Query()
-        res = self.table.get(KnowledgeQuery.file_name == file_name)
-        return res
+        row = self.conn.execute(
+            "SELECT file_name, summary, type FROM knowledge WHERE file_name = ?",
+            (file_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"file_name": row[0], "summary": row[1], "type": row[2]}
+
+    # One template per doc; a single join avoids the O(N^2) allocation
+    # pattern of repeated string +=.
+    _DOC_TEMPLATE = (
+        "--- START OF DOC: {n} ---\n"
+        "TYPE: {t}\n"
+        "SUMMARY: {s}\n"
+        "--- END OF DOC: {n} ---\n\n"
+    )
+
+    def list_summaries_brief(self):
+        """Cheap listing for the agent: ids, names, types and a short
+        preview instead of every full summary."""
+        rows = self.conn.execute(
+            "SELECT rowid, file_name, type, substr(summary, 1, 120) FROM knowledge"
+        ).fetchall()
+        return [
+            {"id": row[0], "file_name": row[1], "source_type": row[2], "preview": row[3]}
+            for row in rows
+        ]
+
+    def get_summary_by_id(self, doc_id: int):
+        """Return the full summary row for an id from list_summaries_brief."""
+        row = self.conn.execute(
+            "SELECT file_name, summary, type FROM knowledge WHERE rowid = ?",
+            (doc_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"file_name": row[0], "summary": row[1], "type": row[2]}
 
     def get_all_summaries(self) -> str:
         """Retrieves all stored summaries as a single string for the LLM."""
-        all_docs = self.table.all()
-        if not all_docs:
+        cursor = self.conn.execute(
+            "SELECT file_name, summary, type FROM knowledge"
+        )
+        body = "".join(
+            self._DOC_TEMPLATE.format(n=file_name, t=source_type, s=summary)
+            for file_name, summary, source_type in cursor
+        )
+        if not body:
             return "No knowledge has been stored yet. Please run the processing tool."
-        
-        knowledge_string = "Here is the current knowledge base:\n\n"
-        for doc in all_docs:
-            knowledge_string += f"--- START OF DOC: {doc['file_name']} ---\n"
-            knowledge_string += f"TYPE: {doc['type']}\n"
-            knowledge_string += f"SUMMARY: {doc['summary']}\n"
-            knowledge_string += f"--- END OF DOC: {doc['file_name']} ---\n\n"
-        
-        return knowledge_string
\ No newline at end of file
+
+        return "Here is the current knowledge base:\n\n" + body
+
+    async def consolidate(self, max_chars: int = 32000, keep_recent: int = 5) -> bool:
+        """Merge older summaries into one compressed row per source type.
+
+        get_all_summaries grows linearly with every processed file and would
+        eventually blow through the model's context window. Once the stored
+        text exceeds `max_chars` (a cheap proxy for ~8K tokens), everything
+        but the `keep_recent` newest rows is compressed by the summarization
+        model into a single '__consolidated__<type>' row and the originals
+        are deleted. Returns True if a consolidation ran.
+        """
+        # substr comparison, not LIKE: underscores in the prefix would act
+        # as single-char wildcards and misclassify ordinary filenames.
+        rows = self.conn.execute(
+            "SELECT rowid, file_name, summary, type FROM knowledge"
+            " WHERE substr(file_name, 1, 16) != '__consolidated__' ORDER BY rowid"
+        ).fetchall()
+        total_chars = sum(len(r[2]) for r in rows)
+        if total_chars <= max_chars or len(rows) <= keep_recent:
+            return False
+
+        overflow = rows[:-keep_recent]
+        by_type = {}
+        for rowid, file_name, summary, source_type in overflow:
+            by_type.setdefault(source_type, []).append((rowid, file_name, summary))
+
+        # Imported lazily: document_tools imports this module at load time.
+        from tools.document_tools import get_summarization_model
+
+        for source_type, docs in by_type.items():
+            consolidated_name = f"__consolidated__{source_type}"
+            blob = "\n\n".join(f"[{name}]\n{summary}" for _, name, summary in docs)
+            existing = self.get_summary(consolidated_name)
+            if existing is not None:
+                blob = existing["summary"] + "\n\n" + blob
+
+            prompt = (
+                "Compress the following document summaries into one consolidated "
+                "summary. Preserve every distinct skill, employer, role, date "
+                "range and education entry; drop filler and repetition.\n\n"
+            )
+            response = await get_summarization_model().generate_content_async(
+                [prompt + blob], stream=False
+            )
+            self.save_summary(
+                file_name=consolidated_name,
+                summary=getattr(response, 'text', str(response)),
+                source_type=source_type
+            )
+            with self._lock:
+                self.conn.executemany(
+                    "DELETE FROM knowledge WHERE rowid = ?",
+                    [(rowid,) for rowid, _, _ in docs]
+                )
+                for _, name, _ in docs:
+                    self._known.discard(name)
+            log.info("Knowledge Service: Consolidated %d '%s' summaries.", len(docs), source_type)
+        return True
+
+    def clear_all(self):
+        """Drop all stored summaries (used by the clear-knowledge UI)."""
+        with self._lock:
+            self.conn.execute("DELETE FROM knowledge")
+            self._known.clear()
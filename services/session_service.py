@@ -1,33 +1,54 @@
 import json
+import sqlite3
+import threading
 import time
 import logging
 from typing import Optional, List, Dict, Any
-from tinydb import TinyDB, Query
 
 from google.adk.sessions import BaseSessionService, Session
 from google.adk.events import Event
 
-# --- Helper Functions (Unchanged) ---
-def event_to_dict(event: Event) -> Dict[str, Any]:
-    """Simplified serialization for the demo."""
-    content_data = {}
-    # If the event.content is a mapping/dict-like, store it directly so
-    # structured content survives round-trip.
-    if isinstance(event.content, dict):
-        content_data = event.content
-    elif hasattr(event.content, 'model_dump'):
-        content_data = event.content.model_dump()
-    elif hasattr(event.content, 'text'):
-        content_data = {"text": event.content.text}
+# orjson (C extension) is several times faster than stdlib json for the
+# event payloads we store per turn; fall back transparently if missing.
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover - fallback when orjson isn't installed
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, separators=(',', ':'))
+
+    _json_loads = json.loads
+
+
+# --- Helper Functions ---
+def event_to_json(event: Event) -> str:
+    """Serialize an event straight to a JSON string for storage.
+
+    When the content is a Pydantic model we splice in model_dump_json()
+    directly, skipping the dict round trip that a model_dump() +
+    json.dumps pipeline would take for large Content objects.
+    """
+    content = event.content
+    if hasattr(content, 'model_dump_json'):
+        content_json = content.model_dump_json()
+    elif isinstance(content, dict):
+        content_json = _json_dumps(content)
+    elif hasattr(content, 'text'):
+        content_json = _json_dumps({"text": content.text})
     else:
-        content_data = {"text": str(event.content)}
+        content_json = _json_dumps({"text": str(content)})
+
+    return (
+        '{"id":' + _json_dumps(event.id)
+        + ',"author":' + _json_dumps(event.author)
+        + ',"content":' + content_json
+        + ',"timestamp":' + _json_dumps(event.timestamp) + '}'
+    )
 
-    return {
-        "id": event.id,
-        "author": event.author,
-        "content": content_data,
-        "timestamp": event.timestamp
-    }
 
 def dict_to_event(data: Dict[str, Any]) -> Event:
     """Simplified deserialization."""
@@ -36,7 +57,7 @@ def dict_to_event(data: Dict[str, Any]) -> Event:
     # reconstruct a simple dict with 'text'.
     # Reconstruct a lightweight Content-like object so callers can access
     # `.parts` and each part's `.text` attribute regardless of how the
-    # content was serialized into TinyDB.
+    # content was serialized into the DB.
     if isinstance(raw_content, dict):
         parts_raw = raw_content.get('parts')
         if isinstance(parts_raw, list):
@@ -90,22 +111,45 @@ def dict_to_event(data: Dict[str, Any]) -> Event:
 logger = logging.getLogger(__name__)
 
 
-class TinyDBSessionService(BaseSessionService):
+class SqliteSessionService(BaseSessionService):
     """
-    Manages chat session history using TinyDB.
+    Manages chat session history using SQLite (WAL mode).
+
+    Replaces the earlier TinyDB backend: TinyDB re-parses and rewrites the
+    whole JSON file per operation, while SQLite gives indexed lookups and
+    O(1) event appends with one connection per process.
     """
-    def __init__(self, db_path: str = "chat_history_db.json"):
+    def __init__(self, db_path: str = "chat_history.db"):
         super().__init__()
-        self.db = TinyDB(db_path)
-        self.sessions_table = self.db.table("sessions")
-        self.SessionQuery = Query()
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        # Serialize writes; the connection is shared across threads.
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " app_name TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT '{}')"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " session_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, seq))"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_sessions_user ON sessions (app_name, user_id)"
+        )
         logger.debug("Chat Session Service connected to '%s'", db_path)
 
     async def create_session(self, app_name: str, user_id: str, session_id: Optional[str] = None, state: Optional[Dict[str, Any]] = None) -> Session:
         if not session_id:
             import uuid
             session_id = str(uuid.uuid4())
-        
+
         new_session = Session(
             id=session_id,
             app_name=app_name,
@@ -113,37 +157,41 @@ class TinyDBSessionService(BaseSessionService):
             state=state or {},
             events=[]
         )
-        
-        self.sessions_table.upsert(
-            {
-                "id": session_id, 
-                "app_name": app_name, 
-                "user_id": user_id, 
-                "state": new_session.state,
-                "events": []
-            }, 
-            self.SessionQuery.id == session_id
-        )
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO sessions (id, app_name, user_id, state) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET app_name=excluded.app_name,"
+                " user_id=excluded.user_id, state=excluded.state",
+                (session_id, app_name, user_id, _json_dumps(new_session.state))
+            )
+            # A (re)created session starts with an empty history.
+            self.conn.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
         return new_session
 
     async def get_session(self, app_name: str, user_id: str, session_id: str) -> Optional[Session]:
-        result = self.sessions_table.search(
-            (self.SessionQuery.app_name == app_name) & 
-            (self.SessionQuery.user_id == user_id) & 
-            (self.SessionQuery.id == session_id)
-        )
-        
-        if not result:
-            return None 
+        row = self.conn.execute(
+            "SELECT id, app_name, user_id, state FROM sessions"
+            " WHERE app_name = ? AND user_id = ? AND id = ?",
+            (app_name, user_id, session_id)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        rehydrated_events = [
+            dict_to_event(_json_loads(payload))
+            for (payload,) in self.conn.execute(
+                "SELECT payload FROM events WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            )
+        ]
 
-        data = result[0]
-        rehydrated_events = [dict_to_event(evt) for evt in data.get("events", [])]
-        
         session = Session(
-            id=data["id"],
-            app_name=data["app_name"],
-            user_id=data["user_id"],
-            state=data["state"],
+            id=row[0],
+            app_name=row[1],
+            user_id=row[2],
+            state=_json_loads(row[3]),
             events=rehydrated_events
         )
         logger.debug("Loaded chat session %s with %d events.", session.id, len(session.events))
@@ -151,44 +199,52 @@ class TinyDBSessionService(BaseSessionService):
 
     async def append_event(self, session: Session, event: Event):
         session.events.append(event)
-        event_data = event_to_dict(event)
-        
-        current_record = self.sessions_table.get(self.SessionQuery.id == session.id)
-        if current_record:
-            current_events = current_record.get("events", [])
-            current_events.append(event_data)
-            
-            self.sessions_table.update(
-                {"events": current_events, "state": session.state},
-                self.SessionQuery.id == session.id
+        payload = event_to_json(event)
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO events (session_id, seq, payload)"
+                " SELECT ?, COALESCE(MAX(seq), -1) + 1, ? FROM events WHERE session_id = ?",
+                (session.id, payload, session.id)
+            )
+            self.conn.execute(
+                "UPDATE sessions SET state = ? WHERE id = ?",
+                (_json_dumps(session.state), session.id)
             )
 
-    
     async def delete_session(self, app_name: str, user_id: str, session_id: str):
-        """Deletes a session from the TinyDB."""
+        """Deletes a session and its events."""
         logger.debug("Deleting session %s...", session_id)
-        self.sessions_table.remove(
-            (self.SessionQuery.app_name == app_name) &
-            (self.SessionQuery.user_id == user_id) &
-            (self.SessionQuery.id == session_id)
-        )
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id)
+            )
+            self.conn.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
 
     async def list_sessions(self, app_name: str, user_id: str) -> List[Session]:
-        """Lists all sessions for a user from the TinyDB."""
+        """Lists all sessions for a user."""
         logger.debug("Listing sessions for user %s...", user_id)
-        results = self.sessions_table.search(
-            (self.SessionQuery.app_name == app_name) & 
-            (self.SessionQuery.user_id == user_id)
-        )
-        
+        rows = self.conn.execute(
+            "SELECT id, app_name, user_id, state FROM sessions"
+            " WHERE app_name = ? AND user_id = ?",
+            (app_name, user_id)
+        ).fetchall()
+
         # Just return basic session info, not all events
         sessions = [
             Session(
-                id=data["id"],
-                app_name=data["app_name"],
-                user_id=data["user_id"],
-                state=data["state"],
-                events=[] # Don't re-hydrate events for a simple list
-            ) for data in results
+                id=row[0],
+                app_name=row[1],
+                user_id=row[2],
+                state=_json_loads(row[3]),
+                events=[]  # Don't re-hydrate events for a simple list
+            ) for row in rows
         ]
-        return sessions
\ No newline at end of file
+        return sessions
+
+    def clear_all(self):
+        """Drop all sessions and events (used by the clear-chat UI)."""
+        with self._lock:
+            self.conn.execute("DELETE FROM events")
+            self.conn.execute("DELETE FROM sessions")
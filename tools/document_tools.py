@@ -1,17 +1,124 @@
 import os
 import asyncio
+import atexit
+import functools
+import hashlib
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
 import google.generativeai as genai
 from services.knowledge_service import KnowledgeService
 
-# This model is for the *tool itself* to use for summarization
-summarization_model = genai.GenerativeModel("gemini-2.0-flash")
+log = logging.getLogger(__name__)
+
+# Under the gathered fan-out, direct print()/StreamHandler writes would
+# serialize every worker on the stdout lock. Records instead go to an
+# in-memory queue (non-blocking) and a background listener thread drains
+# them to stderr.
+if not log.handlers:
+    _log_queue = SimpleQueue()
+    log.addHandler(QueueHandler(_log_queue))
+    _log_listener = QueueListener(_log_queue, logging.StreamHandler())
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+# orjson where available (same fallback pattern as the services).
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # pragma: no cover - fallback when orjson isn't installed
+    from json import loads as _json_loads
+
+
+# Bump when the summarization prompts change so stale cached summaries
+# stop matching (the version is baked into the stored content hash).
+PROMPT_VERSION = "v1"
+
+
+def _file_sha256(path: str) -> str:
+    """Constant-memory content hash: streams the file instead of reading
+    it whole, so a 10+ MB scanned PDF never sits in RAM just for hashing.
+    """
+    with open(path, 'rb') as fh:
+        if hasattr(hashlib, 'file_digest'):  # 3.11+: OpenSSL streaming path
+            return hashlib.file_digest(fh, 'sha256').hexdigest()
+        h = hashlib.sha256()
+        while chunk := fh.read(1 << 20):
+            h.update(chunk)
+        return h.hexdigest()
+
+
+def _cache_key(digest: str) -> str:
+    """Key used for the summary content-hash cache."""
+    return f"{PROMPT_VERSION}:{digest}"
+
+
+# Extension -> (prompt, source_type) dispatch, shared by both tools: one
+# splitext/lower per file instead of chained lower().endswith() probes.
+_PDF_PROMPT = "Summarize this resume. Extract key skills, all work experience (company, role, dates), and education."
+_IMG_PROMPT = "Describe this image in detail."
+_EXT_MAP = {
+    '.pdf': (_PDF_PROMPT, "Resume (PDF)"),
+    '.jpg': (_IMG_PROMPT, "Image"),
+    '.jpeg': (_IMG_PROMPT, "Image"),
+    '.png': (_IMG_PROMPT, "Image"),
+}
+
+
+def _classify(file_name: str):
+    """Return (prompt, source_type) for a supported file, else None."""
+    return _EXT_MAP.get(os.path.splitext(file_name)[1].lower())
+
+
+# Below this size, file bytes go inline in the generate request — one HTTP
+# call instead of the upload + generate + delete triple.
+_INLINE_MAX_BYTES = 20 * 1024 * 1024
+
+_MIME_BY_EXT = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+}
+
+
+def _mime_for(file_name: str) -> str:
+    return _MIME_BY_EXT.get(os.path.splitext(file_name)[1].lower(), 'application/octet-stream')
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as fh:
+        return fh.read()
+
+
+# These models are for the *tools themselves* to use for summarization.
+# Built lazily and cached so every caller (both tools, any thread) shares
+# one instance and its underlying HTTP client/connection pool, instead of
+# paying model construction and fresh TLS handshakes per call.
+# Template-driven text extraction doesn't need the full flash model, so
+# the default is the cheaper flash-lite; image description keeps full
+# flash for fidelity. Both are overridable via env.
+@functools.cache
+def get_summarization_model():
+    return genai.GenerativeModel(os.getenv("SUMMARY_MODEL", "gemini-2.0-flash-lite"))
+
+
+@functools.cache
+def get_image_model():
+    return genai.GenerativeModel(os.getenv("IMAGE_MODEL", "gemini-2.0-flash"))
+
+
+def _model_for(source_type: str):
+    return get_image_model() if source_type == "Image" else get_summarization_model()
 
 
 def create_document_tools(knowledge_service: KnowledgeService, resumes_dir: str = None):
     """
     Factory function to create tool closures with access to the
     knowledge service. Returns a list of async tool callables in the
-    following order: [process_single_resume_tool, process_static_resumes_tool, query_knowledge_base_tool]
+    following order: [process_single_resume_tool, process_static_resumes_tool,
+    query_knowledge_base_tool, list_knowledge_brief_tool, get_summary_by_id_tool]
     """
 
     # Resolve the resumes directory: prefer explicit argument, otherwise
@@ -20,100 +127,293 @@ def create_document_tools(knowledge_service: KnowledgeService, resumes_dir: str
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         resumes_dir = os.path.join(project_root, 'resumes')
 
+    # Processed files land here to avoid re-processing on future runs.
+    processed_dir = os.path.join(resumes_dir, 'processed')
+
+    def _move_to_processed(file_path: str, file_name: str):
+        # Non-fatal on failure: the file just stays in place.
+        try:
+            os.makedirs(processed_dir, exist_ok=True)
+            os.replace(file_path, os.path.join(processed_dir, file_name))
+        except Exception:
+            pass
+
+    # How many files share one Gemini request in the batch path.
+    BATCH_SIZE = int(os.getenv('DOC_AGENT_BATCH_SIZE', '6'))
+
+    _BATCH_PROMPT = (
+        "You are given {count} attached files, in this order: {names}.\n"
+        "For each file: {instruction}\n"
+        "Return ONLY a JSON array with one object per file, of the form "
+        '[{{"file_name": "<name>", "summary": "<summary>"}}, ...], '
+        "using the file names exactly as listed above."
+    )
+
     async def process_static_resumes_tool() -> str:
         """
         Processes all PDF and image files in the configured 'resumes'
-        folder. It uploads each file to be summarized, then saves the
-        summary to the TinyDB knowledge base.
+        folder. Files are summarized in batches of a few per Gemini
+        request (structured JSON output), with a per-file fallback,
+        then each summary is saved to the knowledge base.
         """
-        print(f"Tool called: process_static_resumes_tool on '{resumes_dir}'")
+        log.info("Tool called: process_static_resumes_tool on '%s'", resumes_dir)
         try:
-            # Check if directory exists
-            if not os.path.isdir(resumes_dir):
+            # Check if directory exists (off-loop: may sit on slow storage)
+            if not await asyncio.to_thread(os.path.isdir, resumes_dir):
                 return f"Error: The directory '{resumes_dir}' does not exist."
 
-            files = os.listdir(resumes_dir)
-            if not files:
+            # scandir gives DirEntry objects with cached type info, skipping
+            # the extra stat() per entry that listdir + isfile would cost.
+            # Size prefilter: 0-byte files would fail the upload and
+            # >20 MiB files exceed the Files API limit — skip both before
+            # paying for an upload + Gemini round trip.
+            MAX_BYTES = 20 * 1024 * 1024
+
+            def _scan():
+                kept, skipped = [], []
+                with os.scandir(resumes_dir) as it:
+                    for e in it:
+                        if not e.is_file(follow_symlinks=False):
+                            continue
+                        size = e.stat().st_size
+                        if 0 < size <= MAX_BYTES:
+                            kept.append(e)
+                        else:
+                            skipped.append((e.name, size))
+                return kept, skipped
+
+            entries, skipped = await asyncio.to_thread(_scan)
+            for name, size in skipped:
+                log.info("Skipping %s: size %d bytes outside (0, %d]", name, size, MAX_BYTES)
+            if not entries:
                 return f"No files found in '{resumes_dir}' to process."
 
-            processed_count = 0
+            # Bound concurrency so a big folder doesn't blast the Gemini
+            # quota; the blocking upload/delete SDK calls run in threads so
+            # the event loop keeps serving the other batches in flight.
+            sem = asyncio.Semaphore(
+                int(os.getenv('GEMINI_CONCURRENCY') or os.getenv('DOC_AGENT_CONCURRENCY') or '8')
+            )
 
-            for file_name in files:
-                file_path = os.path.join(resumes_dir, file_name)
-
-                # Determine file type and prompt
-                prompt = ""
-                source_type = "unknown"
-                if file_name.lower().endswith(".pdf"):
-                    prompt = "Summarize this resume. Extract key skills, all work experience (company, role, dates), and education."
-                    source_type = "Resume (PDF)"
-                elif file_name.lower().endswith((".jpg", ".jpeg", ".png")):
-                    prompt = "Describe this image in detail."
-                    source_type = "Image"
-                else:
+            processed_count = 0
+            errors = []
+
+            # Entries: (file_name, file_path, prompt, source_type, sha256)
+            to_model = []
+            cache_hits, cache_moves = [], []
+            for entry in entries:
+                file_name = entry.name
+                kind = _classify(file_name)
+                if kind is None:
                     continue  # Skip unsupported files
-
-                print(f"Tool: Processing {file_name}...")
+                prompt, source_type = kind
 
                 # Skip if already processed
                 if knowledge_service.has_summary(file_name):
-                    print(f"Skipping {file_name}: already processed")
+                    log.info("Skipping %s: already processed", file_name)
                     continue
 
-                # 1. Upload file as a "Prompt Artifact"
-                uploaded_file = genai.upload_file(path=file_path)
+                file_path = entry.path
+
+                # Content-hash cache: identical bytes under a new name reuse
+                # the stored summary instead of burning another Gemini call.
+                # The key embeds PROMPT_VERSION so prompt changes invalidate.
+                digest = _cache_key(await asyncio.to_thread(_file_sha256, file_path))
+                cached = knowledge_service.get_summary_by_hash(digest)
+                if cached is not None:
+                    log.info("Tool: %s matches %s by content, reusing summary.", file_name, cached['file_name'])
+                    cache_hits.append((file_name, cached['summary'], source_type, digest))
+                    cache_moves.append((file_path, file_name))
+                else:
+                    to_model.append((file_name, file_path, prompt, source_type, digest))
+
+            # All hash-cache hits land in one transaction, not one write each.
+            if cache_hits:
+                knowledge_service.save_summaries_bulk(cache_hits)
+                for file_path, file_name in cache_moves:
+                    _move_to_processed(file_path, file_name)
+                processed_count += len(cache_hits)
+
+            async def _process_one(entry) -> bool:
+                """Per-file path: one upload, one Gemini call."""
+                nonlocal processed_count
+                file_name, file_path, prompt, source_type, digest = entry
+                async with sem:
+                    log.info("Tool: Processing %s...", file_name)
+                    data = await asyncio.to_thread(_read_bytes, file_path)
+                    if len(data) <= _INLINE_MAX_BYTES:
+                        # Inline bytes: no separate upload/delete round trips
+                        response = await _model_for(source_type).generate_content_async(
+                            [{"mime_type": _mime_for(file_name), "data": data}, prompt],
+                            stream=False
+                        )
+                    else:
+                        del data  # too big to inline; stream via the Files API
+                        uploaded_file = await asyncio.to_thread(genai.upload_file, path=file_path)
+                        response = await _model_for(source_type).generate_content_async(
+                            [uploaded_file, prompt],
+                            stream=False
+                        )
+                        try:
+                            await asyncio.to_thread(genai.delete_file, uploaded_file.name)
+                        except Exception:
+                            # Non-fatal: log and continue
+                            pass
+                    knowledge_service.save_summary(
+                        file_name=file_name,
+                        summary=getattr(response, 'text', str(response)),
+                        source_type=source_type,
+                        sha256=digest
+                    )
+                _move_to_processed(file_path, file_name)
+                processed_count += 1
+                return True
+
+            async def _process_batch(batch) -> list:
+                """Several files in one Gemini request; asks for a JSON array
+                of per-file summaries. Returns the entries that need the
+                per-file fallback (parse failure / missing from the array).
+                """
+                nonlocal processed_count
+                names = [e[0] for e in batch]
+                async with sem:
+                    log.info("Tool: Processing batch of %d: %s", len(batch), ", ".join(names))
+                    uploads = await asyncio.gather(
+                        *[asyncio.to_thread(genai.upload_file, path=e[1]) for e in batch]
+                    )
+                    prompt = _BATCH_PROMPT.format(
+                        count=len(batch),
+                        names=", ".join(names),
+                        instruction=batch[0][2]
+                    )
+                    response = await _model_for(batch[0][3]).generate_content_async(
+                        [*uploads, prompt],
+                        generation_config={'response_mime_type': 'application/json'},
+                        stream=False
+                    )
+                    for uploaded_file in uploads:
+                        try:
+                            await asyncio.to_thread(genai.delete_file, uploaded_file.name)
+                        except Exception:
+                            pass
 
-                # 2. Call the model to get the summary
-                response = await summarization_model.generate_content_async(
-                    [uploaded_file, prompt],
-                    stream=False
-                )
+                try:
+                    entries = _json_loads(getattr(response, 'text', '') or '')
+                    summaries = {
+                        d['file_name']: d['summary'] for d in entries
+                        if isinstance(d, dict) and d.get('file_name') and d.get('summary')
+                    }
+                except Exception as e:
+                    log.warning("Batch response parse failed (%s); falling back to per-file.", e)
+                    summaries = {}
+
+                fallback, to_save, moves = [], [], []
+                for entry in batch:
+                    file_name, file_path, _, source_type, digest = entry
+                    summary = summaries.get(file_name)
+                    if summary is None:
+                        fallback.append(entry)
+                        continue
+                    to_save.append((file_name, summary, source_type, digest))
+                    moves.append((file_path, file_name))
+
+                # One transaction for the whole batch, then the file moves.
+                if to_save:
+                    knowledge_service.save_summaries_bulk(to_save)
+                    for file_path, file_name in moves:
+                        _move_to_processed(file_path, file_name)
+                    processed_count += len(to_save)
+                return fallback
+
+            # Batch per source type (the instruction differs), chunked so one
+            # request carries at most BATCH_SIZE attachments. Singletons skip
+            # straight to the per-file path.
+            by_type = {}
+            for entry in to_model:
+                by_type.setdefault(entry[3], []).append(entry)
+
+            batch_tasks, single_entries = [], []
+            for group in by_type.values():
+                for i in range(0, len(group), BATCH_SIZE):
+                    chunk = group[i:i + BATCH_SIZE]
+                    if len(chunk) == 1:
+                        single_entries.append(chunk[0])
+                    else:
+                        batch_tasks.append(_process_batch(chunk))
+
+            batch_results = await asyncio.gather(*batch_tasks, return_exceptions=True)
+            for res in batch_results:
+                if isinstance(res, Exception):
+                    errors.append(res)
+                else:
+                    single_entries.extend(res)
 
-                # 3. Save summary to our knowledge DB
-                knowledge_service.save_summary(
-                    file_name=file_name,
-                    summary=getattr(response, 'text', str(response)),
-                    source_type=source_type
-                )
+            single_results = await asyncio.gather(
+                *[_process_one(e) for e in single_entries], return_exceptions=True
+            )
+            errors.extend(r for r in single_results if isinstance(r, Exception))
 
-                # 4. Clean up the uploaded file
-                try:
-                    genai.delete_file(uploaded_file.name)
-                except Exception:
-                    # Non-fatal: log and continue
-                    pass
-                # Move processed file to a 'processed' subfolder to avoid
-                # accidental re-processing on future runs.
-                try:
-                    processed_dir = os.path.join(resumes_dir, 'processed')
-                    os.makedirs(processed_dir, exist_ok=True)
-                    target_path = os.path.join(processed_dir, file_name)
-                    os.replace(file_path, target_path)
-                except Exception:
-                    # Non-fatal: if move fails, keep file in place
-                    pass
-                processed_count += 1
+            for err in errors:
+                log.error("Error in tool: %s", err)
 
-            if processed_count == 0:
+            if processed_count == 0 and not errors:
                 return "No new supported files (PDF/Image) found in the 'resumes' folder."
+            if errors:
+                return (f"Processed {processed_count} files; {len(errors)} failed "
+                        f"(first error: {errors[0]}).")
 
             return f"Successfully processed and saved summaries for {processed_count} files."
 
         except FileNotFoundError:
             return f"Error: The folder '{resumes_dir}' was not found."
         except Exception as e:
-            print(f"Error in tool: {e}")
+            log.error("Error in tool: %s", e)
             return f"An error occurred: {str(e)}"
 
 
+    async def list_knowledge_brief_tool() -> str:
+        """
+        Lists the stored knowledge entries as one line each
+        (id | file_name | type | preview). Use get_summary_by_id_tool
+        to fetch the full summary for the ids that look relevant.
+        """
+        log.info("Tool called: list_knowledge_brief_tool")
+        briefs = knowledge_service.list_summaries_brief()
+        if not briefs:
+            return "No knowledge has been stored yet. Please run the processing tool."
+        return "\n".join(
+            f"{b['id']} | {b['file_name']} | {b['source_type']} | {b['preview']}"
+            for b in briefs
+        )
+
+
+    async def get_summary_by_id_tool(doc_id: int) -> str:
+        """
+        Retrieves one full stored summary by the id shown in the
+        brief listing.
+        """
+        log.info("Tool called: get_summary_by_id_tool(%s)", doc_id)
+        doc = knowledge_service.get_summary_by_id(doc_id)
+        if doc is None:
+            return f"Error: no knowledge entry with id {doc_id}."
+        return f"--- {doc['file_name']} ({doc['type']}) ---\n{doc['summary']}"
+
+
     async def query_knowledge_base_tool() -> str:
         """
-        Retrieves all file summaries (resumes, etc.) from the
-        TinyDB knowledge base. The agent can then use this
-        information to answer questions.
+        Surveys the knowledge base: returns the brief per-document
+        listing (id | file_name | type | preview). Fetch full summaries
+        for relevant entries with get_summary_by_id_tool instead of
+        pulling every document into context.
         """
-        print("Tool called: query_knowledge_base_tool")
-        return knowledge_service.get_all_summaries()
+        log.info("Tool called: query_knowledge_base_tool")
+        # Opportunistically compress older summaries so the stored knowledge
+        # stays bounded (no-op while the KB is small).
+        try:
+            await knowledge_service.consolidate()
+        except Exception as e:
+            log.warning("Knowledge consolidation skipped: %s", e)
+        return await list_knowledge_brief_tool()
 
 
     async def process_single_resume_tool(file_path: str) -> str:
@@ -130,25 +430,40 @@ def create_document_tools(knowledge_service: KnowledgeService, resumes_dir: str
             if knowledge_service.has_summary(file_name):
                 return f"Skipped: '{file_name}' already processed."
 
-            # Determine prompt and type
-            prompt = ""
-            source_type = "unknown"
-            if file_name.lower().endswith(".pdf"):
+            # Determine prompt and type via the shared extension map; the
+            # upload path asks for the candidate's name too.
+            kind = _classify(file_name)
+            if kind is None:
+                return f"Skipped: unsupported file type for '{file_name}'."
+            _, source_type = kind
+            if source_type == "Resume (PDF)":
                 prompt = "Summarize this resume. Extract Name, key skills, all work experience (company, role, dates), and education."
-                source_type = "Resume (PDF)"
-            elif file_name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                prompt = "Describe this image in detail."
-                source_type = "Image"
             else:
-                return f"Skipped: unsupported file type for '{file_name}'."
-
-            uploaded_file = genai.upload_file(path=file_path)
-            response = await summarization_model.generate_content_async([uploaded_file, prompt], stream=False)
-            knowledge_service.save_summary(file_name=file_name, summary=getattr(response, 'text', str(response)), source_type=source_type)
-            try:
-                genai.delete_file(uploaded_file.name)
-            except Exception:
-                pass
+                prompt = _IMG_PROMPT
+
+            # Content-hash cache: reuse the summary if these exact bytes were
+            # already processed under another name (key embeds PROMPT_VERSION).
+            digest = _cache_key(await asyncio.to_thread(_file_sha256, file_path))
+            cached = knowledge_service.get_summary_by_hash(digest)
+            if cached is not None:
+                knowledge_service.save_summary(file_name=file_name, summary=cached['summary'], source_type=source_type, sha256=digest)
+            else:
+                data = await asyncio.to_thread(_read_bytes, file_path)
+                if len(data) <= _INLINE_MAX_BYTES:
+                    # Inline bytes: no separate upload/delete round trips
+                    response = await _model_for(source_type).generate_content_async(
+                        [{"mime_type": _mime_for(file_name), "data": data}, prompt], stream=False)
+                else:
+                    # upload_file is a blocking call in this SDK; keep it off the
+                    # event loop so concurrent tool calls aren't stalled.
+                    del data
+                    uploaded_file = await asyncio.to_thread(genai.upload_file, path=file_path)
+                    response = await _model_for(source_type).generate_content_async([uploaded_file, prompt], stream=False)
+                    try:
+                        await asyncio.to_thread(genai.delete_file, uploaded_file.name)
+                    except Exception:
+                        pass
+                knowledge_service.save_summary(file_name=file_name, summary=getattr(response, 'text', str(response)), source_type=source_type, sha256=digest)
             # Move processed file into a sibling 'processed' folder to avoid re-processing
             try:
                 processed_dir = os.path.join(os.path.dirname(file_path), 'processed')
@@ -162,64 +477,9 @@ def create_document_tools(knowledge_service: KnowledgeService, resumes_dir: str
             return f"Error processing '{file_path}': {e}"
 
 
-    def process_single_resume_sync(file_path: str) -> str:
-        """Synchronous wrapper that runs the async processing in a fresh
-        event loop and creates a local model bound to that loop to avoid
-        cross-loop Future attachment errors."""
-        async def _inner():
-            try:
-                if not os.path.isfile(file_path):
-                    return f"Error: file '{file_path}' does not exist."
-
-                file_name = os.path.basename(file_path)
-                if knowledge_service.has_summary(file_name):
-                    return f"Skipped: '{file_name}' already processed."
-
-                # determine prompt
-                prompt = ""
-                source_type = "unknown"
-                if file_name.lower().endswith('.pdf'):
-                    prompt = "Summarize this resume. Extract Name, key skills, all work experience (company, role, dates), and education."
-                    source_type = "Resume (PDF)"
-                elif file_name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    prompt = "Describe this image in detail."
-                    source_type = "Image"
-                else:
-                    return f"Skipped: unsupported file type for '{file_name}'."
-
-                # Upload file (sync)
-                uploaded_file = genai.upload_file(path=file_path)
-
-                # Create a local model bound to this loop and call async API
-                local_model = genai.GenerativeModel("gemini-2.0-flash")
-                response = await local_model.generate_content_async([uploaded_file, prompt], stream=False)
-
-                knowledge_service.save_summary(file_name=file_name, summary=getattr(response, 'text', str(response)), source_type=source_type)
-                try:
-                    genai.delete_file(uploaded_file.name)
-                except Exception:
-                    pass
-
-                try:
-                    processed_dir = os.path.join(os.path.dirname(file_path), 'processed')
-                    os.makedirs(processed_dir, exist_ok=True)
-                    target_path = os.path.join(processed_dir, file_name)
-                    os.replace(file_path, target_path)
-                except Exception:
-                    pass
-
-                return f"Processed: {file_name}"
-            except Exception as e:
-                return f"Error processing '{file_path}': {e}"
-
-        # Run the coroutine in a fresh event loop for this thread
-        try:
-            return asyncio.run(_inner())
-        except Exception as e:
-            return f"Error running processing loop: {e}"
-
-
-    # Return the list of raw functions. The first entry is a synchronous
-    # single-file processor (useful for callers that want to call it from
-    # a thread without managing event loops).
-    return [process_single_resume_sync, process_single_resume_tool, process_static_resumes_tool, query_knowledge_base_tool]
\ No newline at end of file
+    # Return the list of raw functions. All entries are async; sync callers
+    # (e.g. the Flask upload handler) should submit process_single_resume_tool
+    # to a running loop via asyncio.run_coroutine_threadsafe rather than
+    # spinning up a fresh loop per call.
+    return [process_single_resume_tool, process_static_resumes_tool,
+            query_knowledge_base_tool, list_knowledge_brief_tool, get_summary_by_id_tool]
\ No newline at end of file
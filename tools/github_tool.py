@@ -11,8 +11,140 @@ problematic.
 """
 import os
 import asyncio
+import hashlib
+import time
+from collections import Counter
+from heapq import nlargest
 from typing import Any, Dict
 
+import requests
+from requests.adapters import HTTPAdapter
+
+# orjson parses the ~100-repo payloads a few times faster than the stdlib
+# json that resp.json() uses; same fallback pattern as the services.
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # pragma: no cover - fallback when orjson isn't installed
+    from json import loads as _json_loads
+
+# One pooled session for all GitHub calls: module-level requests.get opens
+# a fresh TLS connection per call, while the session reuses keep-alive
+# connections to api.github.com across requests and tool invocations.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=20))
+_session.headers.update({"Accept": "application/vnd.github+json"})
+
+# Per-URL ETag cache for conditional GETs: on 304 GitHub sends no body and
+# (for most endpoints) doesn't count the request against the rate limit.
+_etag_cache: Dict[str, tuple] = {}
+
+# Formatted-summary cache: agent planners tend to call the tool several
+# times per run, so memoize the final string for a short window.
+_tool_cache: Dict[str, tuple] = {}
+_TOOL_CACHE_TTL = 300.0  # seconds
+
+
+def _do_get(url: str, headers: Dict[str, str], timeout: int = 10):
+    """GET with one Retry-After-aware retry on rate-limit responses.
+
+    GitHub signals secondary rate limits with 403/429 plus Retry-After
+    (seconds) or X-RateLimit-Reset (epoch). Sleeping for the advertised
+    interval (capped at 10s) and retrying once beats returning an error
+    that the agent immediately retries in a tight loop.
+    """
+    resp = _session.get(url, headers=headers, timeout=timeout)
+    if resp.status_code in (403, 429):
+        wait = 2
+        try:
+            if resp.headers.get("Retry-After"):
+                wait = int(resp.headers["Retry-After"])
+            elif resp.headers.get("X-RateLimit-Reset"):
+                wait = max(0, int(resp.headers["X-RateLimit-Reset"]) - int(time.time()))
+        except ValueError:
+            pass
+        time.sleep(min(wait, 10))
+        resp = _session.get(url, headers=headers, timeout=timeout)
+    return resp
+
+
+def _get_json(url: str, headers: Dict[str, str], timeout: int = 10):
+    """GET a GitHub URL with If-None-Match; returns (status, data).
+
+    status is 200/304 with parsed JSON on success (304 replays the cached
+    body), or the error status with the response text otherwise.
+    """
+    etag, cached = _etag_cache.get(url, (None, None))
+    if etag:
+        headers = {**headers, "If-None-Match": etag}
+    resp = _do_get(url, headers, timeout)
+    if resp.status_code == 304 and cached is not None:
+        return 304, cached
+    if resp.status_code != 200:
+        return resp.status_code, resp.text
+    data = _json_loads(resp.content)
+    if resp.headers.get("ETag"):
+        _etag_cache[url] = (resp.headers["ETag"], data)
+    return 200, data
+
+
+# One POST fetches user fields and the top-100 repos together; the REST
+# path needs two requests and only exposes each repo's primary language.
+_GRAPHQL_QUERY = """
+query($login: String!) {
+  user(login: $login) {
+    login name bio
+    followers { totalCount }
+    following { totalCount }
+    repositories(first: 100, ownerAffiliations: OWNER,
+                 orderBy: {field: STARGAZERS, direction: DESC}) {
+      totalCount
+      nodes { name stargazerCount primaryLanguage { name } pushedAt url }
+    }
+  }
+}
+"""
+
+
+def _fetch_graphql(username: str, token: str, timeout: int = 10):
+    """Fetch the profile via the GraphQL v4 API in a single request.
+
+    Returns (user, repos) shaped like the REST responses so the downstream
+    aggregation/formatting is shared, or None to signal REST fallback.
+    """
+    try:
+        resp = _session.post(
+            "https://api.github.com/graphql",
+            json={"query": _GRAPHQL_QUERY, "variables": {"login": username}},
+            headers={"Authorization": f"bearer {token}"},
+            timeout=timeout,
+        )
+        if resp.status_code != 200:
+            return None
+        u = _json_loads(resp.content).get("data", {}).get("user")
+        if u is None:
+            return None
+        repos = [
+            {
+                "name": n["name"],
+                "stargazers_count": n.get("stargazerCount", 0),
+                "language": (n.get("primaryLanguage") or {}).get("name"),
+                "pushed_at": n.get("pushedAt"),
+                "html_url": n.get("url"),
+            }
+            for n in u["repositories"]["nodes"]
+        ]
+        user = {
+            "login": u["login"],
+            "name": u.get("name"),
+            "bio": u.get("bio"),
+            "public_repos": u["repositories"]["totalCount"],
+            "followers": u["followers"]["totalCount"],
+            "following": u["following"]["totalCount"],
+        }
+        return user, repos
+    except Exception:
+        return None
+
 
 def make_github_profile_tool(provided_username: str = None, provided_token: str = None):
     """Factory that returns an async tool function using the provided
@@ -30,76 +162,123 @@ def make_github_profile_tool(provided_username: str = None, provided_token: str
             return "Error: GITHUB_USERNAME not set. Set `GITHUB_USERNAME` in .env or export it before starting the app."
 
         token = provided_token or os.getenv("GITHUB_TOKEN")
-        headers = {
-            "Accept": "application/vnd.github+json"
-        }
+
+        cache_key = f"{username}:{hashlib.sha256((token or '').encode()).hexdigest()[:8]}"
+        now = time.monotonic()
+        hit = _tool_cache.get(cache_key)
+        if hit and now - hit[0] < _TOOL_CACHE_TTL:
+            return hit[1]
+
+        # Accept header lives on the shared session; only auth is per-call.
+        headers = {}
         if token:
             headers["Authorization"] = f"token {token}"
 
-        def fetch() -> Dict[str, Any]:
-            import requests
-
-            base = "https://api.github.com"
-            timeout = 10
-
-            user_resp = requests.get(f"{base}/users/{username}", headers=headers, timeout=timeout)
-            if user_resp.status_code != 200:
-                return {"error": f"Failed to fetch user: {user_resp.status_code} {user_resp.text}"}
-            user = user_resp.json()
-
-            repos_resp = requests.get(f"{base}/users/{username}/repos?per_page=100", headers=headers, timeout=timeout)
-            if repos_resp.status_code != 200:
-                return {"error": f"Failed to fetch repos: {repos_resp.status_code} {repos_resp.text}"}
-            repos = repos_resp.json()
-
-            # Aggregate simple stats
-            total_stars = sum(r.get("stargazers_count", 0) for r in repos)
-            top_repos = sorted(repos, key=lambda r: r.get("stargazers_count", 0), reverse=True)[:5]
-            languages: Dict[str, int] = {}
-            for r in repos:
-                lang = r.get("language")
-                if lang:
-                    languages[lang] = languages.get(lang, 0) + 1
-
-            recent = sorted(repos, key=lambda r: r.get("pushed_at") or r.get("updated_at", ""), reverse=True)[:3]
-
-            return {
-                "user": user,
-                "repos": repos,
-                "total_stars": total_stars,
-                "top_repos": top_repos,
-                "languages": languages,
-                "recent": recent,
-            }
+        base = "https://api.github.com"
+        timeout = 10
 
-        result = await asyncio.to_thread(fetch)
+        def _get_user() -> Dict[str, Any]:
+            status, data = _get_json(f"{base}/users/{username}", headers, timeout)
+            if status not in (200, 304):
+                return {"error": f"Failed to fetch user: {status} {data}"}
+            return data
 
-        if isinstance(result, dict) and "error" in result:
-            return result["error"]
+        def _get_repos_page(page: int = 1):
+            status, data = _get_json(f"{base}/users/{username}/repos?per_page=100&page={page}", headers, timeout)
+            if status not in (200, 304):
+                return {"error": f"Failed to fetch repos: {status} {data}"}
+            return data
+
+        # GraphQL needs a token; single POST replaces both REST calls.
+        user = repos = None
+        if token:
+            gql = await asyncio.to_thread(_fetch_graphql, username, token)
+            # The GraphQL query carries only the first 100 repos; accept its
+            # result only when that covers the account, otherwise fall through
+            # to the REST path below, which paginates.
+            if gql is not None and (gql[0].get("public_repos") or 0) <= 100:
+                user, repos = gql
+
+        if user is None:
+            # REST fallback: the two requests have no data dependency,
+            # so overlap them.
+            user, repos = await asyncio.gather(
+                asyncio.to_thread(_get_user), asyncio.to_thread(_get_repos_page)
+            )
+            if isinstance(user, dict) and "error" in user:
+                return user["error"]
+            if isinstance(repos, dict) and "error" in repos:
+                return repos["error"]
+
+            # Users with <= 100 public repos stay on the single-call fast
+            # path; beyond that, fetch the remaining pages in parallel on
+            # the pooled session (skipping a failed page beats failing all).
+            public_repos_count = user.get("public_repos") or 0
+            if public_repos_count > 100:
+                n_pages = -(-public_repos_count // 100)
+                extra_pages = await asyncio.gather(
+                    *[asyncio.to_thread(_get_repos_page, p) for p in range(2, n_pages + 1)]
+                )
+                for page in extra_pages:
+                    if not (isinstance(page, dict) and "error" in page):
+                        repos.extend(page)
+
+        # Aggregate simple stats: one pass for stars + language counts, and
+        # nlargest (O(n log k)) instead of full sorts just to take 5/3 items.
+        total_stars = 0
+        languages: Counter = Counter()
+        for r in repos:
+            total_stars += r.get("stargazers_count", 0)
+            lang = r.get("language")
+            if lang:
+                languages[lang] += 1
+
+        top_repos = nlargest(5, repos, key=lambda r: r.get("stargazers_count", 0))
+        recent = nlargest(3, repos, key=lambda r: r.get("pushed_at") or r.get("updated_at", ""))
+
+        result = {
+            "total_stars": total_stars,
+            "top_repos": top_repos,
+            "languages": languages,
+            "recent": recent,
+        }
+        login = user.get("login")
+        display_name = user.get("name") or ""
+        bio = user.get("bio")
+        public_repos = user.get("public_repos")
+        followers = user.get("followers")
+        following = user.get("following")
 
-        user = result["user"]
-        lines = []
-        lines.append(f"GitHub profile for {user.get('login')} ({user.get('name') or ''})")
-        if user.get("bio"):
-            lines.append(f"Bio: {user.get('bio')}")
-        lines.append(f"Public repos: {user.get('public_repos')} | Followers: {user.get('followers')} | Following: {user.get('following')}")
-        lines.append(f"Total stars across fetched repos: {result['total_stars']}")
+        lines = [f"GitHub profile for {login} ({display_name})"]
+        if bio:
+            lines.append(f"Bio: {bio}")
+        lines.append(f"Public repos: {public_repos} | Followers: {followers} | Following: {following}")
+        lines.append(f"Total stars across fetched repos: {total_stars}")
 
         lines.append("Top repos by stars:")
         for r in result["top_repos"]:
-            lines.append(f"- {r['name']}: {r.get('stargazers_count',0)} stars | {r.get('language') or 'unknown'} | {r.get('html_url')}")
+            # Bind once per row instead of re-probing the dict per field
+            name = r["name"]
+            stars = r.get("stargazers_count", 0)
+            lang = r.get("language") or "unknown"
+            url = r.get("html_url")
+            lines.append(f"- {name}: {stars} stars | {lang} | {url}")
 
-        lang_items = sorted(result["languages"].items(), key=lambda kv: kv[1], reverse=True)
+        lang_items = result["languages"].most_common(8)
         if lang_items:
-            lines.append("Languages used (by repo count): " + ", ".join(f"{k}({v})" for k, v in lang_items[:8]))
+            lines.append("Languages used (by repo count): " + ", ".join(f"{k}({v})" for k, v in lang_items))
 
         lines.append("Recently updated repos:")
         for r in result["recent"]:
-            lines.append(f"- {r['name']}: pushed_at {r.get('pushed_at') or r.get('updated_at')}")
+            name = r["name"]
+            pushed = r.get("pushed_at") or r.get("updated_at")
+            lines.append(f"- {name}: pushed_at {pushed}")
 
         lines.append("\n(End of GitHub summary)")
 
-        return "\n".join(lines)
+        summary = "\n".join(lines)
+        _tool_cache[cache_key] = (now, summary)
+        return summary
 
     return github_profile_tool
 